@@ -2,26 +2,45 @@
 
 from pathlib import Path
 import sys
+from functools import lru_cache
 from math import floor
-from pyfountain import FountainDoc
+from pyfountain import (
+    ACTION,
+    CHARACTER,
+    DIALOGUE,
+    PAGE_BREAK,
+    PARENTHETICAL,
+    TRANSITION,
+    FountainDoc,
+)
 
 DEBUG = False
 
 WIDTHS: dict[str, float] = {
-    "Action": 6.0,
-    "Dialogue": 3.3,
-    "Character": 3.3,
-    "Parenthetical": 2.0,
-    "Transition": 1.5,
+    ACTION: 6.0,
+    DIALOGUE: 3.3,
+    CHARACTER: 3.3,
+    PARENTHETICAL: 2.0,
+    TRANSITION: 1.5,
 }
 
-SKIPBREAKS: tuple[tuple[str, str], ...] = (
-    ("Character", "Dialogue"),
-    ("Character", "Parenthetical"),
-    ("Dialogue", "Parenthetical"),
-    ("Parenthetical", "Dialogue"),
+SKIPBREAKS: frozenset[tuple[str, str]] = frozenset(
+    (
+        (CHARACTER, DIALOGUE),
+        (CHARACTER, PARENTHETICAL),
+        (DIALOGUE, PARENTHETICAL),
+        (PARENTHETICAL, DIALOGUE),
+    )
 )
 
+# Small integer codes for the types in WIDTHS, so the pagecount loop can index
+# lists instead of hashing type names. Other types count as Action.
+_TYPE_CODES: dict[str, int] = {etype: code for code, etype in enumerate(WIDTHS)}
+_ACTION_CODE = _TYPE_CODES[ACTION]
+_SKIPBREAK_TABLE: list[list[bool]] = [
+    [(prevtype, etype) in SKIPBREAKS for etype in WIDTHS] for prevtype in WIDTHS
+]
+
 
 def pagecount(
     fount: FountainDoc, lines_per_page: int = 55, char_per_inch: float | int = 12
@@ -29,41 +48,76 @@ def pagecount(
     """Estimate the page count of the given Fountain screenplay."""
     pages = 0
     lines = 0
-    prevtype: str = ""
+    prevcode: int = -1
+    widths = [floor(width * char_per_inch) for width in WIDTHS.values()]
     for elem in fount.elements:
-        match etype := elem.type:
-            case "Page Break":
-                pages += 1
-                lines = 0
-                prevtype = ""
-                continue
-            case _:
-                if etype not in WIDTHS:
-                    etype = "Action"
-                width = floor(WIDTHS[etype] * char_per_inch)
-                lines += len(wrap(elem.text, width).splitlines())
-        if prevtype and (prevtype, etype) not in SKIPBREAKS:
-            lines += 1
-        while lines >= lines_per_page:
+        etype = elem.type
+        if etype == PAGE_BREAK:
             pages += 1
-            lines -= lines_per_page
-        prevtype = etype
+            lines = 0
+            prevcode = -1
+            continue
+        code = _TYPE_CODES.get(etype, _ACTION_CODE)
+        lines += count_wrapped_lines(elem.text, widths[code])
+        if prevcode >= 0 and not _SKIPBREAK_TABLE[prevcode][code]:
+            lines += 1
+        if lines >= lines_per_page:
+            newpages, lines = divmod(lines, lines_per_page)
+            pages += newpages
+        prevcode = code
     return pages
 
 
+@lru_cache(maxsize=4096)
+def count_wrapped_lines(text: str, linewidth: int) -> int:
+    """Count the lines the given text takes up once wrapped, without building
+    the wrapped text. Matches counting the newlines in wrap()'s output.
+
+    Results are cached, since screenplays repeat many short elements such as
+    character names and transitions.
+
+    >>> count_wrapped_lines('the quick brown fox', 10)
+    2
+    >>> count_wrapped_lines('', 10)
+    0
+    >>> wrap('the quick brown fox', 10).count('\\n') + 1
+    2
+    """
+    # Short text always fits on one line, so skip the word loop entirely.
+    if len(text) < linewidth:
+        return 0 if text.isspace() or not text else 1
+    words = text.split()
+    if not words:
+        return 0
+    lines = 1
+    spaceleft = linewidth
+    for word in words:
+        wlen = len(word)
+        if wlen + 1 > spaceleft:
+            lines += 1
+            spaceleft = linewidth - wlen
+        else:
+            spaceleft -= wlen + 1
+    return lines
+
+
 def wrap(text: str, linewidth: int) -> str:
-    """Line wrap the given text."""
-    out = ""
+    """Line wrap the given text.
+
+    Only needed for laying the text out; pagecount uses count_wrapped_lines.
+    """
+    parts: list[str] = []
     spaceleft = linewidth
     for word in text.split():
-        appended = f"{word} "
-        if len(appended) > spaceleft:
-            out += f"\n{word} "
-            spaceleft = linewidth - len(word)
+        wlen = len(word)
+        if wlen + 1 > spaceleft:
+            parts.append("\n")
+            spaceleft = linewidth - wlen
         else:
-            out += appended
-            spaceleft -= len(appended)
-    return out.rstrip()
+            spaceleft -= wlen + 1
+        parts.append(word)
+        parts.append(" ")
+    return "".join(parts).rstrip()
 
 
 def main(args: list[str]):
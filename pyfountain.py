@@ -4,13 +4,52 @@ based on the Fountain FastFountainDoc at:
 github.com/nyousefi/Fountain/blob/master/Fountain/FastFountainDoc.m
 """
 import re
+import sys
 import logging
+from collections.abc import Iterator
 from dataclasses import dataclass
 
 INLINE_PATTERN = "^([^\\t\\s][^:]+):\\s*([^\\t\\s].*$)"
 DIRECTIVE_PATTERN = "^([^\\t\\s][^:]+):([\\t\\s]*$)"
 CONTENT_PATTERN = ""
 
+# Element types, as stored in FountainElem.type. Interned so the parser can
+# compare them by identity.
+ACTION = sys.intern("Action")
+DIALOGUE = sys.intern("Dialogue")
+CHARACTER = sys.intern("Character")
+PARENTHETICAL = sys.intern("Parenthetical")
+TRANSITION = sys.intern("Transition")
+SCENE_HEADING = sys.intern("Scene Heading")
+PAGE_BREAK = sys.intern("Page Break")
+LYRICS = sys.intern("Lyrics")
+SYNOPSIS = sys.intern("Synopsis")
+COMMENT = sys.intern("Comment")
+BONEYARD = sys.intern("Boneyard")
+SECTION_HEADING = sys.intern("Section Heading")
+
+_RE_LEADING_SPACE = re.compile(r"\s*")
+_RE_INLINE = re.compile(INLINE_PATTERN)
+_RE_DIRECTIVE = re.compile(DIRECTIVE_PATTERN)
+_RE_COMMENT_BRACKET = re.compile(r"^\s*\[{2}\s*([^\]\n])+\s*\]{2}\s*$")
+_RE_SCENE_NUM = re.compile(r"#([^\n#]*?)#\s*$")
+_RE_SCENE_PREFIX = re.compile(
+    r"^(INT|EXT|EST|(I|INT)\.?\/(E|EXT)\.?)[\.\-\s][^\n]+$", re.IGNORECASE
+)
+# First characters of lines that may be lyrics, forced action or characters,
+# boneyard, page breaks, synopses, notes, sections or forced scene headings.
+# Blank lines ("") and lines opening with whitespace may be as well.
+_MARKUP_FIRST = frozenset(("", "~", "!", "@", "/", "*", "=", "[", "#", "."))
+
+# Every character _RE_SCENE_PREFIX can start with, including the Turkish
+# dotted and dotless I that IGNORECASE folds onto "i".
+_SCENE_PREFIX_FIRST = frozenset("EIei\u0130\u0131")
+_RE_TRANSITION_TO = re.compile(r"[^a-z]*TO:$")
+# Also captures the dual dialogue marker in the "dual" group, saving a second
+# match on every character cue.
+_RE_CHARACTER = re.compile(r"^(?=(?P<dual>\^\s*$)?)[^a-z]+(\(cont'd\))?$")
+_RE_DUAL_STRIP = re.compile(r"\s*\^\s*$")
+
 
 def range_replace(source: str, start: int, end: int, new: str) -> str:
     """Replace all text in the given range of the source string with the new
@@ -22,7 +61,34 @@ def range_replace(source: str, start: int, end: int, new: str) -> str:
     return source[:start] + new + source[end:]
 
 
-@dataclass
+def _iter_lines(text: str, chunk_size: int = 65536) -> Iterator[str]:
+    """Yield the same lines as text.splitlines(), without holding a list of
+    every line in the text at once.
+
+    >>> list(_iter_lines('one\\ntwo\\r\\n\\nthree', chunk_size=2))
+    ['one', 'two', '', 'three']
+    """
+    start = 0
+    end = len(text)
+    while start < end:
+        # Cutting just after a newline keeps every line break whole.
+        cut = text.find("\n", start + chunk_size)
+        cut = end if cut < 0 else cut + 1
+        yield from text[start:cut].splitlines()
+        start = cut
+
+
+def _count_leading(line: str, char: str) -> int:
+    """Return how many times the given character repeats at the start of the
+    line.
+
+    >>> _count_leading('### Act', '#')
+    3
+    """
+    return len(line) - len(line.lstrip(char))
+
+
+@dataclass(slots=True)
 class FountainElem:
     """A single element in a parsed Fountain document."""
 
@@ -49,239 +115,270 @@ class FountainDoc:
 
     def _parse_contents(self, contents: str):
         """Parse the fountain source text."""
-        contents = contents.lstrip() + "\n\n"
+        leading = _RE_LEADING_SPACE.match(contents)
+        assert leading is not None
+        start: int = leading.end()
 
-        firstblank: int = contents.index("\n\n")
-        top = contents[:firstblank]
+        firstblank: int = contents.find("\n\n", start)
+        if firstblank < 0:
+            # The title page then runs to the end, less any final newline.
+            firstblank = len(contents) - 1 if contents.endswith("\n") else len(contents)
 
-        self._title(top)
-        self._body("\n" + contents[firstblank:])
+        self._title(contents[start:firstblank])
+        self._body(contents[firstblank:])
 
     def _body(self, contents: str):
-        """Parse the function body."""
-        lines = contents.splitlines()
-        nl_before: int = 0
-        index: int = -1
+        """Parse the function body, which always follows a blank line."""
+        lines = _iter_lines(contents)
+        nextline = next(lines, None)
+        nl_before: int = 1
         comment_block: bool = False
         indialog: bool = False
         comment_text: str = ""
-
-        for line in lines:
-            index += 1
-
-            if len(line) > 0 and line[0] == "~":
-                if self.elements:
-                    lastelem = self.elements[-1]
-                else:
-                    lastelem = None
-                if lastelem is None:
-                    element = FountainElem("Lyrics", line)
-                    self.elements.append(element)
+        elements = self.elements
+        lastelem: FountainElem | None = None
+        # Lines continuing lastelem, starting with its own text. They are
+        # joined once the element is done, instead of recopying the text for
+        # every line.
+        parts: list[str] = []
+
+        while nextline is not None:
+            line = nextline
+            nextline = next(lines, None)
+
+            first = line[:1]
+            if comment_block or first in _MARKUP_FIRST or first.isspace():
+                if first == "~":
+                    if lastelem is None:
+                        lastelem = FountainElem(LYRICS, line)
+                        self._add_element(lastelem, parts)
+                        nl_before = 0
+                        continue
+                    if lastelem.type is LYRICS and nl_before > 0:
+                        self._add_element(FountainElem(LYRICS, " "), parts)
+                    lastelem = FountainElem(LYRICS, line)
+                    self._add_element(lastelem, parts)
                     nl_before = 0
                     continue
-                if lastelem.type == "Lyrics" and nl_before > 0:
-                    self.elements.append(FountainElem("Lyrics", " "))
-                self.elements.append(FountainElem("Lyrics", line))
-                nl_before = 0
-                continue
 
-            if len(line) > 0 and line[0] == "!":
-                self.elements.append(FountainElem("Action", line))
-                nl_before = 0
-                continue
+                if first == "!":
+                    lastelem = FountainElem(ACTION, line)
+                    self._add_element(lastelem, parts)
+                    nl_before = 0
+                    continue
 
-            if len(line) > 0 and line[0] == "@":
-                self.elements.append(FountainElem("Character", line))
-                nl_before = 0
-                indialog = True
-                continue
+                if first == "@":
+                    lastelem = FountainElem(CHARACTER, line)
+                    self._add_element(lastelem, parts)
+                    nl_before = 0
+                    indialog = True
+                    continue
 
-            if re.match(r"^\s{2}$", line):
-                if indialog:
+                if len(line) == 2 and line.isspace():
+                    if indialog:
+                        nl_before = 0
+                        lastelem = self._add_dialogue(lastelem, line, parts)
+                        continue
+                    lastelem = FountainElem(ACTION, line)
+                    self._add_element(lastelem, parts)
                     nl_before = 0
-                    prevelem = self.elements[-1]
-                    if prevelem.type == "Dialogue":
-                        prevelem.text = f"{prevelem.text}\n{line}"
-                    else:
-                        self.elements.append(FountainElem("Dialogue", line))
                     continue
-                self.elements.append(FountainElem("Action", line))
-                nl_before = 0
-                continue
 
-            if line == "" and not comment_block:
-                indialog = False
-                nl_before += 1
-                continue
+                if line == "" and not comment_block:
+                    indialog = False
+                    nl_before += 1
+                    continue
 
-            if line.startswith("/*"):
-                if re.match(r"\*\/\s*$", line):
-                    text = line.replace("/*", "").replace("*/", "")
+                if line.startswith("/*"):
+                    if line.startswith("*/") and line[2:].strip() == "":
+                        text = line.replace("/*", "").replace("*/", "")
+                        comment_block = False
+                        lastelem = FountainElem(BONEYARD, text)
+                        self._add_element(lastelem, parts)
+                        nl_before = 0
+                    else:
+                        comment_block = True
+                        comment_text += "\n"
+                    continue
+                if line.startswith("*/") and line[2:].strip() == "":
+                    text = line.replace("*/", "")
+                    if (not text) or re.match(text, r"^\s*$"):
+                        comment_text += text.strip()
                     comment_block = False
-                    self.elements.append(FountainElem("Boneyard", text))
+                    lastelem = FountainElem(BONEYARD, comment_text)
+                    self._add_element(lastelem, parts)
+                    comment_text = ""
                     nl_before = 0
-                else:
-                    comment_block = True
-                    comment_text += "\n"
-                continue
-            if re.match(r"\*\/\s*$", line):
-                text = line.replace("*/", "")
-                if (not text) or re.match(text, r"^\s*$"):
-                    comment_text += text.strip()
-                comment_block = False
-                self.elements.append(FountainElem("Boneyard", comment_text))
-                comment_text = ""
-                nl_before = 0
-                continue
-
-            if comment_block:
-                comment_text += "line" + "\n"
-                continue
+                    continue
 
-            if re.match(r"^={3,}\s*$", line):
-                self.elements.append(FountainElem("Page Break", line))
-                nl_before = 0
-                continue
+                if comment_block:
+                    comment_text += "line" + "\n"
+                    continue
 
-            if len(line.strip()) > 0 and line.strip()[0] == "=":
-                match = re.match(r"^\s*={1}", line)
-                assert match is not None
-                markup = match.span(0)
-                text = range_replace(line, markup[0], markup[1], "")
-                self.elements.append(FountainElem("Synopsis", text))
-                continue
+                equals = _count_leading(line, "=")
+                if equals >= 3 and line[equals:].strip() == "":
+                    lastelem = FountainElem(PAGE_BREAK, line)
+                    self._add_element(lastelem, parts)
+                    nl_before = 0
+                    continue
 
-            if nl_before > 0 and (
-                match := re.match(r"^\s*\[{2}\s*([^\]\n])+\s*\]{2}\s*$", line)
-            ):
-                text = line.replace("[[", "").replace("]]", "").strip()
-                self.elements.append(FountainElem("Comment", text))
-                continue
+                trimline = line.lstrip()
+                if trimline.startswith("="):
+                    lastelem = FountainElem(SYNOPSIS, trimline[1:])
+                    self._add_element(lastelem, parts)
+                    continue
 
-            if len(line.strip()) > 0 and line.strip()[0] == "#":
-                nl_before = 0
-                match = re.match(r"^\s*#+", line)
-                assert match is not None
-                markup = match.span(0)
-                depth = markup[1] - markup[0]
-
-                text = line[markup[1] :]
-                if (not text) or text == "":
-                    logging.log(1, "Error in Section Heading")
+                if nl_before > 0 and (match := _RE_COMMENT_BRACKET.match(line)):
+                    text = line.replace("[[", "").replace("]]", "").strip()
+                    lastelem = FountainElem(COMMENT, text)
+                    self._add_element(lastelem, parts)
                     continue
 
-                element = FountainElem("Section Heading", text, section_depth=depth)
-                self.elements.append(element)
-                continue
+                if trimline.startswith("#"):
+                    nl_before = 0
+                    text = trimline[_count_leading(trimline, "#") :]
+                    depth = len(line) - len(text)
+                    if (not text) or text == "":
+                        logging.log(1, "Error in Section Heading")
+                        continue
 
-            if len(line) > 1 and line[0] == "." and line[1] != ".":
-                nl_before = 0
-                scene_num = None
-                text = ""
-                if match := re.match(r"#([^\n#]*?)#\s*$", line):
-                    scene_num = match[1]
-                    text = text[: match.span()[0]]
-                    text = text[1 : match.span()[0]].strip()
-                else:
-                    text = line[1:].strip()
-                element = FountainElem("Scene Heading", text)
-                if scene_num is not None:
-                    element.scene_num = scene_num
-                self.elements.append(element)
-                continue
+                    element = FountainElem(SECTION_HEADING, text, section_depth=depth)
+                    lastelem = element
+                    self._add_element(lastelem, parts)
+                    continue
+
+                if first == "." and len(line) > 1 and line[1] != ".":
+                    nl_before = 0
+                    scene_num = None
+                    text = ""
+                    if match := _RE_SCENE_NUM.match(line):
+                        scene_num = match[1]
+                        text = text[: match.span()[0]]
+                        text = text[1 : match.span()[0]].strip()
+                    else:
+                        text = line[1:].strip()
+                    lastelem = FountainElem(SCENE_HEADING, text, scene_num=scene_num)
+                    self._add_element(lastelem, parts)
+                    continue
+            else:
+                trimline = line
 
-            if nl_before > 0 and re.search(
-                "^(INT|EXT|EST|(I|INT)\\.?\\/(E|EXT)\\.?)[\\.\\-\\s][^\\n]+$",
-                line,
-                re.IGNORECASE,
+            if (
+                nl_before > 0
+                and first in _SCENE_PREFIX_FIRST
+                and _RE_SCENE_PREFIX.search(line)
             ):
                 nl_before = 0
                 scene_num = None
                 text = None
-                if match := re.match("#([^\\n#]*?)#\\s*$", line):
+                if match := _RE_SCENE_NUM.match(line):
                     scene_num = match[1]
-                    text = re.sub("#([^\\n#]*?)#\\s*$", "", line)
+                    text = _RE_SCENE_NUM.sub("", line)
                 else:
                     text = line
-                element = FountainElem("Scene Heading", text)
-                if scene_num is not None:
-                    element.scene_num = scene_num
-                self.elements.append(element)
+                lastelem = FountainElem(SCENE_HEADING, text, scene_num=scene_num)
+                self._add_element(lastelem, parts)
                 continue
 
-            if re.match("[^a-z]*TO:$", line):
+            if line.endswith("TO:") and _RE_TRANSITION_TO.match(line):
                 nl_before = 0
-                self.elements.append(FountainElem("Transition", line))
+                lastelem = FountainElem(TRANSITION, line)
+                self._add_element(lastelem, parts)
                 continue
 
-            trimline = line.lstrip()
             transitions = ("FADE OUT.", "CUT TO BLACK.", "FADE TO BLACK.")
             if trimline in transitions:
                 nl_before = 0
-                self.elements.append(FountainElem("Transition", line))
+                lastelem = FountainElem(TRANSITION, line)
+                self._add_element(lastelem, parts)
                 continue
 
             if line[0] == ">":
                 if len(line) > 1 and line[-1] == "<":
                     text = line[1:-1].strip()
-                    element = FountainElem("Action", text)
-                    element.centered = True
-                    self.elements.append(element)
+                    lastelem = FountainElem(ACTION, text, centered=True)
+                    self._add_element(lastelem, parts)
                     nl_before = 0
                     continue
                 text = line[1:].strip()
-                self.elements.append(FountainElem("Transition", text))
+                lastelem = FountainElem(TRANSITION, text)
+                self._add_element(lastelem, parts)
                 nl_before = 0
                 continue
 
-            if nl_before > 0 and re.match("^[^a-z]+(\\(cont'd\\))?$", line):
-                nextindex = index + 1
-                if nextindex < len(lines):
-                    nextline = lines[index + 1]
-                    if nextline != "":
-                        nl_before = 0
-                        element = FountainElem("Character", line)
-
-                        if re.match("\\^\\s*$", line):
-                            element.is_dual_dialog = True
-                            element.text = re.sub("\\s*\\^\\s*$", "", element.text)
-                            found_prev_char = False
-                            subindex = len(self.elements) - 1
-                            while subindex >= 0 and not found_prev_char:
-                                prevelem = self.elements[subindex]
-                                if prevelem.type == "Character":
-                                    prevelem.is_dual_dialog = True
-                                    found_prev_char = True
-                                subindex -= 1
-
-                        self.elements.append(element)
-                        indialog = True
-                        continue
+            if nl_before > 0 and (character := _RE_CHARACTER.match(line)):
+                if nextline:
+                    nl_before = 0
+                    if character["dual"] is not None:
+                        element = FountainElem(
+                            CHARACTER,
+                            _RE_DUAL_STRIP.sub("", line),
+                            is_dual_dialog=True,
+                        )
+                        found_prev_char = False
+                        subindex = len(elements) - 1
+                        while subindex >= 0 and not found_prev_char:
+                            prevelem = elements[subindex]
+                            if prevelem.type is CHARACTER:
+                                prevelem.is_dual_dialog = True
+                                found_prev_char = True
+                            subindex -= 1
+                    else:
+                        element = FountainElem(CHARACTER, line)
+
+                    lastelem = element
+                    self._add_element(lastelem, parts)
+                    indialog = True
+                    continue
 
             if indialog:
-                if nl_before == 0 and re.match("^\\s*\\(", line):
-                    self.elements.append(FountainElem("Parenthetical", line))
+                if nl_before == 0 and trimline.startswith("("):
+                    lastelem = FountainElem(PARENTHETICAL, line)
+                    self._add_element(lastelem, parts)
                     continue
-                prevelem = self.elements[-1]
-                if prevelem.type == "Dialogue":
-                    prevelem.text = f"{prevelem.text}\n{line}"
-                else:
-                    self.elements.append(FountainElem("Dialogue", line))
+                lastelem = self._add_dialogue(lastelem, line, parts)
                 continue
 
-            if nl_before == 0 and len(self.elements) > 0:
-                prevelem = self.elements[-1]
-                if prevelem.type == "Scene Heading":
-                    prevelem.type = "Action"
+            if nl_before == 0 and lastelem is not None:
+                if lastelem.type is SCENE_HEADING:
+                    lastelem.type = ACTION
 
-                prevelem.text = f"{prevelem.text}\n{line}"
+                if not parts:
+                    parts.append(lastelem.text)
+                parts.append(line)
                 nl_before = 0
                 continue
             else:
-                self.elements.append(FountainElem("Action", line))
+                lastelem = FountainElem(ACTION, line)
+                self._add_element(lastelem, parts)
                 nl_before = 0
                 continue
 
+        if parts:
+            elements[-1].text = "\n".join(parts)
+
+    def _add_element(self, element: FountainElem, parts: list[str]) -> None:
+        """Append an element, first joining any lines queued in parts into the
+        text of the element before it."""
+        if parts:
+            self.elements[-1].text = "\n".join(parts)
+            parts.clear()
+        self.elements.append(element)
+
+    def _add_dialogue(
+        self, lastelem: FountainElem | None, line: str, parts: list[str]
+    ) -> FountainElem:
+        """Add a line of dialogue, queueing it in parts if the last element is
+        already dialogue. Returns the element holding the line."""
+        if lastelem is not None and lastelem.type is DIALOGUE:
+            if not parts:
+                parts.append(lastelem.text)
+            parts.append(line)
+            return lastelem
+        element = FountainElem(DIALOGUE, line)
+        self._add_element(element, parts)
+        return element
+
     def _title(self, top: str):
         """Parse the title page."""
         foundtitle: bool = False
@@ -290,15 +387,16 @@ class FountainDoc:
         toplines = top.splitlines()
 
         for line in toplines:
-            if line == "" or re.match(DIRECTIVE_PATTERN, line):
+            directive = _RE_DIRECTIVE.match(line)
+            if line == "" or directive:
                 foundtitle = True
                 if openkey != "":
                     self.title_page.append({openkey: openvals})
-                if match := re.match(DIRECTIVE_PATTERN, line):
-                    openkey = match[1].lower()
+                if directive:
+                    openkey = directive[1].lower()
                     if openkey == "author":
                         openkey = "authors"
-            elif match := re.match(INLINE_PATTERN, line):
+            elif match := _RE_INLINE.match(line):
                 foundtitle = True
                 if openkey != "":
                     self.title_page.append({openkey: openvals})